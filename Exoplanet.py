@@ -5,25 +5,59 @@
 # pip install streamlit plotly pandas numpy requests astropy google-generativeai
 
 # Import necessary libraries   
+import hashlib
+import io
 import requests
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 import streamlit as st
-from astropy.constants import G
-from astropy import units as u
-import google.generativeai as genai
 import time
 from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
 
-# Configure the Gemini API
-genai.configure(api_key=st.secrets["api_key"]) 
-# Initialize the model with the correct name
-model = genai.GenerativeModel('gemini-2.0-flash-001')  
+# Configure the Gemini API and initialize the model on first use, so the AI client
+# (and its grpc dependencies) is only imported when the AI features are actually used
+@st.cache_resource(show_spinner=False)
+def get_model():
+    import google.generativeai as genai
+    genai.configure(api_key=st.secrets["api_key"])
+    # Initialize the model with the correct name
+    return genai.GenerativeModel('gemini-2.0-flash-001')
+
+# Checked before calling the cached AI helpers, so a missing key is never cached as an answer
+def has_api_key():
+    try:
+        return "api_key" in st.secrets
+    except FileNotFoundError:  # No secrets.toml at all
+        return False
+
+# Reuse one HTTP session per server process so repeated fetches share the TCP/TLS connection;
+# a module-level Session would be recreated (and leaked) on every script rerun
+@st.cache_resource(show_spinner=False)
+def _get_session():
+    return requests.Session()
+
+# Target dtypes of the numeric archive columns. Columns shown to users stay float64: the
+# archive gives e.g. orbital periods to 7-9 significant digits, which float32 would alter.
+# Columns that are never displayed use float32, which rounds them to ~7 significant digits
+_NUMERIC_DTYPES = {
+    'pl_bmasse': 'float64',
+    'pl_orbper': 'float64',
+    'pl_orbsmax': 'float64',
+    'pl_orbeccen': 'float32',
+    'st_mass': 'float64',
+    'st_teff': 'float32',
+    'pl_rade': 'float32',
+}
+
+# Columns every downstream tab needs; rows missing any of them are dropped once, inside the cached fetch
+_REQUIRED_COLUMNS = ['pl_bmasse', 'pl_orbper', 'pl_orbsmax', 'pl_orbeccen', 'st_mass']
 
 # Step 1: Fetch Exoplanet Data from NASA Exoplanet Archive
-@st.cache_data(ttl=3600)  # Cache for 1 hour
+# cache_resource hands back the same DataFrame on every rerun instead of a fresh copy;
+# callers must treat it as read-only and .copy() before adding columns
+@st.cache_resource(ttl=3600, show_spinner=False)  # Cache for 1 hour
 def fetch_exoplanet_data(limit=10000):
     url = "https://exoplanetarchive.ipac.caltech.edu/TAP/sync"
     query = f"""
@@ -43,29 +77,24 @@ def fetch_exoplanet_data(limit=10000):
         pl_bmasse IS NOT NULL AND
         pl_orbper IS NOT NULL AND
         pl_orbsmax IS NOT NULL AND
+        pl_orbeccen IS NOT NULL AND
         st_mass IS NOT NULL
     ORDER BY
         pl_orbper ASC
     """
     params = {
         "query": query,
-        "format": "json"
+        "format": "csv"
     }
 
     try:
-        response = requests.get(url, params=params, timeout=10)  # Add timeout
+        response = _get_session().get(url, params=params, timeout=10)  # Add timeout
         if response.status_code == 200:
-            data = response.json()
-            df = pd.DataFrame(data)
-            
-            # Convert numeric columns immediately
-            numeric_columns = ['pl_bmasse', 'pl_orbper', 'pl_orbsmax', 'pl_orbeccen', 'st_mass', 'st_teff', 'pl_rade']
-            for col in numeric_columns:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
+            # Parse with the numeric dtypes fixed up front, no per-column conversion afterwards
+            df = pd.read_csv(io.BytesIO(response.content), dtype=_NUMERIC_DTYPES)
             
-            # Drop NA rows immediately
-            df = df.dropna(subset=['pl_bmasse', 'pl_orbper', 'pl_orbsmax', 'st_mass'])
+            # Drop NA rows immediately so the cached frame is already clean
+            df = df.dropna(subset=_REQUIRED_COLUMNS)
             return df
     except requests.exceptions.RequestException as e:
         st.error(f"Error fetching data: {str(e)}")
@@ -75,41 +104,58 @@ def fetch_exoplanet_data(limit=10000):
         return None
 
 # Step 2: Calculate Radial Velocity Amplitude (K)
-def calculate_radial_velocity(planet_mass, star_mass, orbital_period, eccentricity=0):
-    planet_mass = planet_mass * u.M_earth  # Planet mass in Earth masses
-    star_mass = star_mass * u.M_sun        # Star mass in Solar masses
-    orbital_period = orbital_period * u.day # Orbital period in days
-
-    orbital_period = orbital_period.to(u.second)  # Convert orbital period to seconds
-    G_const = G.value  # Gravitational constant (m^3 kg^-1 s^-2)
-
-    planet_mass_kg = planet_mass.to(u.kg).value  # Convert planet mass to kg
-    star_mass_kg = star_mass.to(u.kg).value      # Convert star mass to kg
+@st.cache_resource(show_spinner=False)
+def _init_constants():
+    # Astropy is only used as the source of these constants; the cache computes them
+    # once per server process, so the hot path below is plain floats
+    from astropy.constants import G
+    from astropy import units as u
+    return (
+        (1 * u.M_earth).to(u.kg).value,  # Earth mass in kg
+        (1 * u.M_sun).to(u.kg).value,    # Solar mass in kg
+        (1 * u.day).to(u.s).value,       # One day in seconds
+        G.value,                         # Gravitational constant (m^3 kg^-1 s^-2)
+    )
+
+_M_EARTH_KG, _M_SUN_KG, _DAY, _G = _init_constants()
+
+def calculate_radial_velocity(planet_mass, star_mass, orbital_period, eccentricity=0.0):
+    # Works on scalars or NumPy arrays (planet mass in Earth masses, star mass in Solar masses, period in days)
+    P_s = np.asarray(orbital_period) * _DAY  # Orbital period in seconds
 
     # Calculate radial velocity amplitude (K) in m/s
-    K = ((2 * np.pi * G_const) / orbital_period.value)**(1/3) * (planet_mass_kg) / (star_mass_kg**(2/3)) / np.sqrt(1 - eccentricity**2)
+    K = (2 * np.pi * _G / P_s)**(1/3) * (np.asarray(planet_mass) * _M_EARTH_KG) / (np.asarray(star_mass) * _M_SUN_KG)**(2/3) / np.sqrt(1 - np.asarray(eccentricity)**2)
     return K  # in m/s
 
 
 # Step 3: Generate Radial Velocity Curve
-def generate_radial_velocity_curve(K, P, time_span):
-    time = np.linspace(0, time_span, 1000)  # Time points (days)
-    velocity = K * np.sin(2 * np.pi * time / P)  # Radial velocity at each time point
-    return time, velocity
+# Every curve spans two orbital periods, so the sine shape is shared and only scaled per planet
+_PHASE = np.linspace(0.0, 2.0, 1000)          # Time in units of the orbital period
+_SIN_TEMPLATE = np.sin(2 * np.pi * _PHASE)    # Unit-amplitude radial velocity curve
+MAX_CURVES = 200     # Most curves drawn at once, to keep browser rendering cheap
+MAX_LEGEND_CURVES = 50  # Above this, all curves are merged into a single unnamed trace
+
+def fill_curves(K, P, times, velocities):
+    # Write every planet's curve into preallocated (N, 1001) arrays in one broadcast per array;
+    # the last column is left as NaN so the rows can be flattened into a single broken line
+    np.multiply(P[:, None], _PHASE, out=times[:, :-1])
+    np.multiply(K[:, None], _SIN_TEMPLATE, out=velocities[:, :-1])
+    times[:, -1] = np.nan
+    velocities[:, -1] = np.nan
+    return times, velocities
 #Step 4: Calculate habitable zone
-def calculate_habitable_zone(star_teff): # Constants for habitable zone calculation (Kopparapu et al. 2014) 
-    S_eff_sun = np.array([1.776, 0.320]) 
-    a = np.array([0.013, 0.094]) 
-    b = np.array([2.04e-4, 1.73e-4]) 
-    c = np.array([-2.89e-8, -5.44e-9]) 
-    T_star = star_teff # Effective temperature of the star 
-    T_sun = 5778 # Effective temperature of the sun 
-    L = (star_teff / T_sun)**4 # Luminosity of the star in terms of solar luminosity
-    # Calculate the inner and outer boundaries of the habitable zone 
-    r_inner = np.sqrt(L / (S_eff_sun[0] + a[0] * (T_star - T_sun) + b[0] * (T_star - T_sun)**2 + c[0] * (T_star - T_sun)**3))
-    r_outer = np.sqrt(L / (S_eff_sun[1] + a[1] * (T_star - T_sun) + b[1] * (T_star - T_sun)**2 + c[1] * (T_star - T_sun)**3)) 
-    return r_inner, r_outer
-    
+def calculate_habitable_zone(T_star):
+    # T_star: effective temperature(s) of the star, scalar or NumPy array
+    T = np.asarray(T_star, dtype=float)
+    T_sun = 5778.0 # Effective temperature of the sun
+    dT = T - T_sun
+    L = (T / T_sun)**4 # Luminosity of the star in terms of solar luminosity
+    # Calculate the inner and outer boundaries of the habitable zone
+    # Constants for habitable zone calculation (Kopparapu et al. 2014)
+    denom_in = 1.776 + 0.013 * dT + 2.04e-4 * dT**2 - 2.89e-8 * dT**3
+    denom_out = 0.320 + 0.094 * dT + 1.73e-4 * dT**2 - 5.44e-9 * dT**3
+    return np.sqrt(L / denom_in), np.sqrt(L / denom_out)
+
 
 
 # Step 5: Streamlit App Setup
@@ -124,15 +170,21 @@ with st.sidebar:
     dataset_count = st.number_input('Enter the number of datasets to import:', min_value=1, max_value=10000, value=10)
 
     df = fetch_exoplanet_data(limit=dataset_count)
-    if df is not None:
-        df = df.dropna(subset=['pl_bmasse', 'pl_orbper', 'pl_orbsmax', 'pl_orbeccen', 'st_mass'])
-    # Filter options
-    min_mass = st.slider('Select minimum planet mass (Earth Masses)', min_value=float(df['pl_bmasse'].min()), max_value=float(df['pl_bmasse'].max()), value=float(df['pl_bmasse'].min()))
-    max_mass = st.slider('Select maximum planet mass (Earth Masses)', min_value=min_mass, max_value=float(df['pl_bmasse'].max()), value=float(df['pl_bmasse'].max()))
-    min_period = st.slider('Select minimum orbital period (days)', min_value=float(df['pl_orbper'].min()), max_value=float(df['pl_orbper'].max()), value=float(df['pl_orbper'].min()))
-    max_period = st.slider('Select maximum orbital period (days)', min_value=min_period, max_value=float(df['pl_orbper'].max()), value=float(df['pl_orbper'].max()))
-    # Slider for eccentricity
-    eccentricity = st.slider('Eccentricity', min_value=0.0, max_value=1.0, step=0.01, value=0.0)
+    # Column ranges for the filter sliders, computed once per rerun
+    mass_min, mass_max = (float(v) for v in df['pl_bmasse'].agg(['min', 'max']))
+    per_min, per_max = (float(v) for v in df['pl_orbper'].agg(['min', 'max']))
+    # Filter options, grouped in a form so the app only reruns when the filters are applied
+    with st.form('filter_form'):
+        min_mass = st.slider('Select minimum planet mass (Earth Masses)', min_value=mass_min, max_value=mass_max, value=mass_min)
+        max_mass = st.slider('Select maximum planet mass (Earth Masses)', min_value=mass_min, max_value=mass_max, value=mass_max)
+        min_period = st.slider('Select minimum orbital period (days)', min_value=per_min, max_value=per_max, value=per_min)
+        max_period = st.slider('Select maximum orbital period (days)', min_value=per_min, max_value=per_max, value=per_max)
+        # Slider for eccentricity
+        eccentricity = st.slider('Eccentricity', min_value=0.0, max_value=1.0, step=0.01, value=0.0)
+        st.form_submit_button('Apply Filters')
+    # All sliders share fixed bounds, so a minimum above its maximum is possible; order each pair
+    min_mass, max_mass = sorted((min_mass, max_mass))
+    min_period, max_period = sorted((min_period, max_period))
   
 
     
@@ -148,29 +200,41 @@ with tab1:
     """)
    
     if df is not None:
-        filtered_df = df[(df['pl_bmasse'] >= min_mass) & (df['pl_bmasse'] <= max_mass) & (df['pl_orbper'] >= min_period) & (df['pl_orbper'] <= max_period)]
+        # Build the filter mask on plain NumPy arrays to avoid intermediate boolean Series
+        masses = df['pl_bmasse'].to_numpy()
+        orbpers = df['pl_orbper'].to_numpy()
+        mask = (masses >= min_mass) & (masses <= max_mass) & (orbpers >= min_period) & (orbpers <= max_period)
+        filtered_df = df[mask]
 
         if filtered_df.empty:
             st.write("No planets match your filters!")
         else:
+            if len(filtered_df) > MAX_CURVES:
+                st.warning(f"{len(filtered_df)} planets match your filters; only the {MAX_CURVES} with the shortest orbital periods are plotted.")
+                filtered_df = filtered_df.nsmallest(MAX_CURVES, 'pl_orbper')
+
             fig = go.Figure()
 
-            for index, planet in filtered_df.iterrows():
-                planet_name = planet['pl_name']
-                star_name = planet['hostname']
-                planet_mass = planet['pl_bmasse']
-                orbital_period = planet['pl_orbper']
-                star_mass = planet['st_mass']
+            names = filtered_df['pl_name'].to_numpy()
+            stars = filtered_df['hostname'].to_numpy()
+            periods = filtered_df['pl_orbper'].to_numpy()
 
-                # Calculate radial velocity amplitude
-                K = calculate_radial_velocity(planet_mass, star_mass, orbital_period, eccentricity)
+            # Calculate radial velocity amplitudes for all planets at once
+            Ks = calculate_radial_velocity(filtered_df['pl_bmasse'].to_numpy(), filtered_df['st_mass'].to_numpy(), periods, eccentricity)
 
-                # Generate radial velocity curve
-                time_span = orbital_period * 2
-                time, velocity = generate_radial_velocity_curve(K, orbital_period, time_span)
+            # Generate all radial velocity curves at once
+            n_points = _PHASE.size + 1
+            times = np.empty((len(filtered_df), n_points), dtype=np.float32)
+            velocities = np.empty((len(filtered_df), n_points), dtype=np.float32)
+            fill_curves(Ks, periods, times, velocities)
 
-                # Add the curve to the Plotly figure
-                fig.add_trace(go.Scatter(x=time, y=velocity, mode='lines', name=f'{planet_name} ({star_name})'))
+            if len(filtered_df) <= MAX_LEGEND_CURVES:
+                for planet_name, star_name, time, velocity in zip(names, stars, times, velocities):
+                    # Add the curve to the Plotly figure
+                    fig.add_trace(go.Scattergl(x=time[:-1], y=velocity[:-1], mode='lines', name=f'{planet_name} ({star_name})'))
+            else:
+                # Draw every curve in one WebGL trace, the NaN after each curve breaks the line
+                fig.add_trace(go.Scattergl(x=times.ravel(), y=velocities.ravel(), mode='lines', showlegend=False))
 
             fig.update_layout(title='Radial Velocity Curves', xaxis_title='Time (days)', yaxis_title='Radial Velocity (m/s)')
             st.plotly_chart(fig)
@@ -266,17 +330,19 @@ with tab4:
         The semi-major axis (`pl_orbsmax`) of each exoplanet is compared against the calculated HZ boundaries to determine if it lies within the HZ.
     5. **Visualization**: A 3D scatter plot visualizes the exoplanets within their respective habitable zones, showing the relationship between the HZ boundaries and the exoplanet's orbital distance. 
     """)
-    df = fetch_exoplanet_data(limit=dataset_count) 
     if df is not None:
          
-        # Calculate Habitable Zone for each star
-        habitable_zones = df['st_teff'].apply(calculate_habitable_zone)
-        df['hz_inner'] = habitable_zones.apply(lambda x: x[0]) 
-        df['hz_outer'] = habitable_zones.apply(lambda x: x[1])
-        # Identify Exoplanets within the Habitable Zone 
-        df['in_hz'] = df.apply(lambda row: row['hz_inner'] <= row['pl_orbsmax'] <= row['hz_outer'], axis=1) 
+        # Only stars with a known effective temperature can have a habitable zone
+        hz_df = df[df['st_teff'].notna()].copy()
+        # Calculate Habitable Zone for all stars at once
+        hz_inner, hz_outer = calculate_habitable_zone(hz_df['st_teff'].to_numpy())
+        hz_df['hz_inner'] = hz_inner
+        hz_df['hz_outer'] = hz_outer
+        # Identify Exoplanets within the Habitable Zone
+        orbsmax = hz_df['pl_orbsmax'].to_numpy()
+        hz_df['in_hz'] = (orbsmax >= hz_inner) & (orbsmax <= hz_outer)
         # Filter Exoplanets in the Habitable Zone
-        habitable_exoplanets = df[df['in_hz']]
+        habitable_exoplanets = hz_df[hz_df['in_hz']]
         st.subheader("Exoplanets within the Habitable Zone") 
         st.write(habitable_exoplanets[['pl_name', 'hostname', 'pl_orbsmax', 'hz_inner', 'hz_outer']])
         # 3D Scatter Plot of Exoplanets within the Habitable Zone 
@@ -302,16 +368,22 @@ with tab5:
 
 
 
+# Cache key for a question: case and whitespace differences map to the same key
+def normalize_query_key(query: str) -> str:
+    return hashlib.sha1(' '.join(query.lower().split()).encode()).hexdigest()
+
+
 # Simple cached function for Gemini responses
+# Cached on query_key only (underscore arguments are not hashed by Streamlit); concurrent
+# calls with the same key wait for the first one instead of each calling the API
 @st.cache_data(ttl=3600)
-def get_ai_response(query: str) -> str:
+def get_ai_response(query_key: str, _query: str) -> str:
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash-001')
-        prompt = f"""As an expert in exoplanetary science, provide a detailed and comprehensive answer to: {query}
+        prompt = f"""As an expert in exoplanetary science, provide a detailed and comprehensive answer to: {_query}
         
         Include relevant scientific concepts, examples, and explanations where appropriate. Format the response with proper markdown for readability."""
         
-        response = model.generate_content(prompt)
+        response = get_model().generate_content(prompt)
         return response.text if response else None
     except Exception as e:
         return f"Error: {str(e)}"
@@ -320,8 +392,11 @@ def get_ai_response(query: str) -> str:
 # Simple function to analyze a specific exoplanet
 @st.cache_data(ttl=3600)
 def analyze_planet(planet_data):
+    # Check the numeric fields up front so missing data never costs a model call
+    required = ('pl_bmasse', 'pl_orbper', 'pl_orbsmax', 'st_mass')
+    if any(pd.isna(planet_data.get(k)) for k in required):
+        return "Insufficient data"
     try:
-        model = genai.GenerativeModel('gemini-pro')
         planet_info = f"""
         Planet Name: {planet_data['pl_name']}
         Host Star: {planet_data['hostname']}
@@ -332,7 +407,7 @@ def analyze_planet(planet_data):
         """
         
         prompt = f"Analyze this exoplanet data and explain its key features in about 100 words:\n{planet_info}"
-        response = model.generate_content(prompt)
+        response = get_model().generate_content(prompt)
         return response.text if response else None
     except Exception as e:
         return f"Error analyzing planet: {str(e)}"
@@ -353,9 +428,11 @@ with tab6:
     # Simple query interface
     query = st.text_input("Enter your question about exoplanets:")
     
-    if query:
+    if query and not has_api_key():
+        st.error("The Gemini API key is not configured. Add `api_key` to `.streamlit/secrets.toml`.")
+    elif query:
         # Use the cached function to get response
-        response = get_ai_response(query)
+        response = get_ai_response(normalize_query_key(query), query)
         
         if response and not response.startswith("Error"):
             st.markdown(response)